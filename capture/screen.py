@@ -1,10 +1,14 @@
 """TFT 게임 화면 캡처 + 인식 통합 모듈"""
 import logging
 import platform
+import queue
+import sys
 import threading
 import time
+import zlib
 from typing import Callable, Optional
 
+import cv2
 import numpy as np
 
 try:
@@ -13,14 +17,90 @@ try:
 except ImportError:
     mss = None
 
+from config import THREAD_SAFETY_CHECKS, TFT_WINDOW_TITLES
+
+_SYSTEM = platform.system()
+
+# macOS: Quartz 창 목록 API (pyobjc). 없으면 osascript 폴백
+Quartz = None
+if _SYSTEM == "Darwin":
+    try:
+        import Quartz
+    except ImportError:
+        pass
+
+# Windows: EnumWindows 콜백 thunk는 모듈 로드 시 한 번만 생성 (탐색마다 만들지 않음)
+if _SYSTEM == "Windows":
+    import ctypes
+    from ctypes import wintypes
+
+    _user32 = ctypes.windll.user32
+    WNDENUMPROC = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+    _user32.EnumWindows.argtypes = [WNDENUMPROC, wintypes.LPARAM]
+    _user32.EnumWindows.restype = wintypes.BOOL
+
+    _probe_lock = threading.Lock()
+    _probe_result: dict = {}
+    _title_buf = ctypes.create_unicode_buffer(256)
+    _title_keywords = [kw.lower() for kw in TFT_WINDOW_TITLES]
+
+    def _enum_window_callback(hwnd, _):
+        if _user32.IsWindowVisible(hwnd):
+            _user32.GetWindowTextW(hwnd, _title_buf, 256)
+            title = _title_buf.value.lower()
+            if any(kw in title for kw in _title_keywords):
+                rect = wintypes.RECT()
+                _user32.GetWindowRect(hwnd, ctypes.byref(rect))
+                _probe_result["left"] = rect.left
+                _probe_result["top"] = rect.top
+                _probe_result["width"] = rect.right - rect.left
+                _probe_result["height"] = rect.bottom - rect.top
+                return False
+        return True
+
+    _enum_cb = WNDENUMPROC(_enum_window_callback)
+
 logger = logging.getLogger(__name__)
 
 
+def _find_window_quartz() -> Optional[dict]:
+    """Quartz CGWindowList로 TFT 창 탐색 (서브프로세스 없이 C 호출 한 번).
+    일반 창(layer 0)이면서 크기가 있는 것만, 창 이름 일치를 소유 앱 이름 일치보다 우선"""
+    options = (Quartz.kCGWindowListOptionOnScreenOnly
+               | Quartz.kCGWindowListExcludeDesktopElements)
+    windows = Quartz.CGWindowListCopyWindowInfo(options, Quartz.kCGNullWindowID) or []
+    keywords = [kw.lower() for kw in TFT_WINDOW_TITLES]
+    owner_match = None
+    for win in windows:
+        # 메뉴바/오버레이/헬퍼 창 제외
+        if win.get("kCGWindowLayer", 0) != 0:
+            continue
+        bounds = win.get("kCGWindowBounds") or {}
+        width = int(bounds.get("Width", 0))
+        height = int(bounds.get("Height", 0))
+        if width <= 0 or height <= 0:
+            continue
+        region = {
+            "left": int(bounds.get("X", 0)),
+            "top": int(bounds.get("Y", 0)),
+            "width": width,
+            "height": height,
+        }
+        name = (win.get("kCGWindowName") or "").lower()
+        if any(kw in name for kw in keywords):
+            return region
+        owner = (win.get("kCGWindowOwnerName") or "").lower()
+        if owner_match is None and any(kw in owner for kw in keywords):
+            owner_match = region
+    return owner_match
+
+
 def _find_tft_window() -> Optional[dict]:
     """TFT 게임 창 영역을 찾아 반환. 못 찾으면 None."""
-    system = platform.system()
     try:
-        if system == "Darwin":
+        if _SYSTEM == "Darwin" and Quartz is not None:
+            return _find_window_quartz()
+        elif _SYSTEM == "Darwin":
             import subprocess
             script = '''
             tell application "System Events"
@@ -43,52 +123,59 @@ def _find_tft_window() -> Optional[dict]:
                 parts = result.stdout.strip().split(",")
                 x, y, w, h = [int(p) for p in parts]
                 return {"left": x, "top": y, "width": w, "height": h}
-        elif system == "Windows":
-            import ctypes
-            from ctypes import wintypes
-            user32 = ctypes.windll.user32
-
-            result_box = {}
-
-            def callback(hwnd, _):
-                if user32.IsWindowVisible(hwnd):
-                    buf = ctypes.create_unicode_buffer(256)
-                    user32.GetWindowTextW(hwnd, buf, 256)
-                    title = buf.value
-                    for kw in ["TFT", "Teamfight Tactics", "League of Legends"]:
-                        if kw.lower() in title.lower():
-                            rect = wintypes.RECT()
-                            user32.GetWindowRect(hwnd, ctypes.byref(rect))
-                            result_box["left"] = rect.left
-                            result_box["top"] = rect.top
-                            result_box["width"] = rect.right - rect.left
-                            result_box["height"] = rect.bottom - rect.top
-                            return False
-                return True
-
-            WNDENUMPROC = ctypes.WINFUNCTYPE(
-                ctypes.c_bool, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)
-            )
-            user32.EnumWindows(WNDENUMPROC(callback), 0)
-            return result_box if result_box else None
+        elif _SYSTEM == "Windows":
+            with _probe_lock:
+                _probe_result.clear()
+                _user32.EnumWindows(_enum_cb, 0)
+                return dict(_probe_result) if _probe_result else None
     except Exception:
         pass
     return None
 
 
 class ScreenCapture:
-    """화면 캡처 + 인식 통합 관리자"""
+    """화면 캡처 + 인식 통합 관리자
+
+    쓰레드 모델 (free-threading 빌드에서도 GIL 없이 안전하도록):
+    - 캡처 쓰레드만 _sct(_sct_lock 하에)와 프레임/카운터/fps를 쓴다
+    - 인식 쓰레드만 _latest_detections를 쓴다 (tuple 통째 교체)
+    - 나머지 쓰레드(Flask 등)는 _lock 하에 읽거나 불변 객체 참조만 읽는다
+    - _callbacks / _detection_callbacks는 copy-on-write tuple
+    - _window_region은 refresh_window 쪽만 쓴다 (dict 참조 통째 교체)
+    latest_frame은 캡처 버퍼를 재사용할 수 있으므로 보관하려면 복사할 것.
+    """
+
+    # BGR 출력 버퍼 개수 (반환된 프레임이 덮어쓰이기 전까지의 캡처 횟수)
+    BUFFER_RING_SIZE = 3
 
     def __init__(self, interval: float = 2.0, detector=None):
         self.interval = interval
         self.detector = detector
         self._running = False
         self._thread: Optional[threading.Thread] = None
+        # 인식은 별도 쓰레드에서 (최신 프레임 1장만 대기, 밀린 프레임은 버림)
+        self._detect_thread: Optional[threading.Thread] = None
+        self._detect_q: queue.Queue = queue.Queue(maxsize=1)
         self._latest_frame: Optional[np.ndarray] = None
-        self._latest_detections: list[dict] = []
+        # 불변 tuple로 통째 교체 → 읽는 쪽은 복사 없이 그대로 반환
+        self._latest_detections: tuple[dict, ...] = ()
+        # 새 인식 결과 저장 시 set (구독 쪽이 clear 후 latest_detections 읽음)
+        self.new_detection_event = threading.Event()
         self._lock = threading.Lock()
-        self._callbacks: list[Callable] = []
+        # copy-on-write: 등록 시 새 tuple로 교체, 루프는 스냅샷만 읽음
+        self._callbacks: tuple[Callable, ...] = ()
+        self._detection_callbacks: tuple[Callable, ...] = ()
         self._window_region: Optional[dict] = None
+        # 창 탐색 쓰레드 (osascript는 수 초 걸릴 수 있어 호출 쓰레드에서 돌리지 않음)
+        self._window_probe: Optional[threading.Thread] = None
+        self._window_probe_pending = False
+        self._window_probe_lock = threading.Lock()
+        # mss 인스턴스는 한 번만 만들고 재사용 (오류 시에만 재생성)
+        self._sct = None
+        self._sct_lock = threading.Lock()
+        # BGR 출력 버퍼 링 (첫 캡처 / 영역 변경 시 할당, 순환 재사용)
+        self._buf_ring: list[np.ndarray] = []
+        self._buf_idx: int = 0
 
         # 상태 추적
         self._fps: float = 0.0
@@ -96,28 +183,44 @@ class ScreenCapture:
         self._last_capture_time: float = 0.0
         self._fps_timer: float = 0.0
 
-    def capture_once(self) -> Optional[np.ndarray]:
-        """한 번 캡처하여 numpy array 반환"""
-        if mss is None:
-            return None
-        try:
-            with mss.mss() as sct:
-                return self._grab(sct)
-        except Exception as e:
-            logger.warning(f"캡처 실패: {e}")
-            return None
+    def capture_once(self, copy: bool = False) -> Optional[np.ndarray]:
+        """한 번 캡처하여 BGR numpy array 반환.
 
-    def _capture_with_sct(self, sct) -> Optional[np.ndarray]:
-        """기존 mss 인스턴스로 캡처 (쓰레드용)"""
-        if sct is None:
-            return None
-        try:
-            return self._grab(sct)
-        except Exception as e:
-            logger.warning(f"캡처 실패: {e}")
+        반환된 배열은 BUFFER_RING_SIZE개 버퍼를 돌려 쓰므로 그 횟수만큼
+        capture_once가 더 호출되면 덮어쓰인다. 보관이 필요하면 copy=True.
+        detector.input_channels == 4 이면 변환 없이 BGRA 배열을 그대로 반환
+        (캡처마다 새 버퍼이므로 재사용 제약 없음).
+        """
+        if mss is None:
             return None
+        with self._sct_lock:
+            try:
+                if self._sct is None:
+                    self._sct = mss.mss()
+                frame = self._grab(self._sct)
+            except Exception as e:
+                logger.warning(f"캡처 실패: {e}")
+                self._close_sct()
+                return None
+        if copy and frame is not None:
+            frame = frame.copy()
+        return frame
+
+    def _owns_buffer(self, frame: np.ndarray) -> bool:
+        return any(frame is buf for buf in self._buf_ring)
+
+    def _close_sct(self):
+        """mss 인스턴스 정리 (다음 캡처 때 재생성)"""
+        sct, self._sct = self._sct, None
+        if sct is not None:
+            try:
+                sct.close()
+            except Exception:
+                pass
 
     def _grab(self, sct) -> Optional[np.ndarray]:
+        if THREAD_SAFETY_CHECKS:
+            assert self._sct_lock.locked(), "mss 인스턴스는 _sct_lock 하에서만 사용"
         # TFT 창 탐색은 수동으로 refresh_window() 호출 시에만
         region = self._window_region
         if region:
@@ -125,12 +228,30 @@ class ScreenCapture:
         else:
             monitor = sct.monitors[1]
             shot = sct.grab(monitor)
-        img = np.array(shot)  # BGRA
-        return img[:, :, :3]  # BGR
+        # mss 버퍼를 복사 없이 BGRA 뷰로 해석
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(
+            shot.height, shot.width, 4)
+        if getattr(self.detector, "input_channels", 3) == 4:
+            return bgra
+        ring = self._buf_ring
+        if not ring or ring[0].shape[:2] != bgra.shape[:2]:
+            ring[:] = [np.empty((shot.height, shot.width, 3), np.uint8)
+                       for _ in range(self.BUFFER_RING_SIZE)]
+            self._buf_idx = 0
+        buf = ring[self._buf_idx]
+        self._buf_idx = (self._buf_idx + 1) % len(ring)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=buf)
+        return buf
 
     def on_frame(self, callback: Callable[[np.ndarray], None]):
         """프레임 콜백 등록"""
-        self._callbacks.append(callback)
+        with self._lock:
+            self._callbacks = self._callbacks + (callback,)
+
+    def on_detection(self, callback: Callable[[np.ndarray, tuple[dict, ...]], None]):
+        """인식 결과 콜백 등록 (인식에 쓴 프레임과 그 결과를 함께, 인식 쓰레드에서 호출)"""
+        with self._lock:
+            self._detection_callbacks = self._detection_callbacks + (callback,)
 
     @property
     def latest_frame(self) -> Optional[np.ndarray]:
@@ -138,9 +259,8 @@ class ScreenCapture:
             return self._latest_frame
 
     @property
-    def latest_detections(self) -> list[dict]:
-        with self._lock:
-            return list(self._latest_detections)
+    def latest_detections(self) -> tuple[dict, ...]:
+        return self._latest_detections
 
     @property
     def fps(self) -> float:
@@ -178,6 +298,9 @@ class ScreenCapture:
         self._frame_count = 0
         self._thread = threading.Thread(target=self._loop, daemon=True)
         self._thread.start()
+        if self.detector:
+            self._detect_thread = threading.Thread(target=self._detect_loop, daemon=True)
+            self._detect_thread.start()
         logger.info("캡처 시작")
 
     def stop(self):
@@ -185,63 +308,155 @@ class ScreenCapture:
         self._running = False
         if self._thread:
             self._thread.join(timeout=5)
+        if self._detect_thread:
+            self._detect_thread.join(timeout=5)
         logger.info("캡처 중지")
 
     def _loop(self):
-        fps_frames = 0
-        fps_start = time.time()
         logger.info("캡처 루프 시작")
+        if mss is None:
+            logger.error("mss 모듈 없음")
+            self._running = False
+            return
         try:
-            # mss는 쓰레드마다 새 인스턴스 필요
-            sct = mss.mss() if mss else None
-            logger.info(f"mss 인스턴스: {sct is not None}")
+            # mss 인스턴스는 루프 시작 시 한 번만 생성
+            with self._sct_lock:
+                self._sct = mss.mss()
         except Exception as e:
             logger.error(f"mss 초기화 실패: {e}")
             self._running = False
             return
 
-        logger.info("캡처 루프 첫 프레임 시도...")
+        gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+        logger.info(f"캡처 루프 첫 프레임 시도... (GIL {'활성' if gil else '비활성'})")
+        try:
+            self._run()
+        finally:
+            with self._sct_lock:
+                self._close_sct()
+
+    def _run(self):
+        fps_frames = 0
+        fps_start = time.monotonic()
+        next_t = time.monotonic()
+        last_key = None
         while self._running:
-            frame = self._capture_with_sct(sct)
+            frame = self.capture_once()
             if self._frame_count == 0 and frame is not None:
                 logger.info(f"첫 프레임 캡처 성공: {frame.shape}")
             elif self._frame_count == 0 and frame is None:
                 logger.warning("첫 프레임 캡처 실패")
             if frame is not None:
-                now = time.time()
+                now = time.monotonic()
 
-                # 인식 실행
-                detections = []
+                # 인식 쓰레드에 최신 프레임 전달 (대기 중인 이전 프레임은 교체)
+                # 링 버퍼 프레임은 몇 틱 뒤 덮어쓰이므로 그 경우만 복사본을 넘긴다
+                # 이전 프레임과 동일하면 (로딩/대기 화면) 인식 생략
+                # 템플릿 로드 전 프레임은 빈 결과이므로 로드 완료 시 같은 화면도 다시 인식
                 if self.detector:
-                    try:
-                        detections = self.detector.detect_champions(frame)
-                    except Exception as e:
-                        logger.error(f"인식 오류: {e}")
-
-                with self._lock:
-                    self._latest_frame = frame
-                    self._latest_detections = detections
-                    self._last_capture_time = now
-                    self._frame_count += 1
+                    detector = self.detector
+                    key = (self._frame_key(frame), getattr(detector, "threshold", None),
+                           getattr(detector, "ready", True))
+                    if key != last_key:
+                        last_key = key
+                        self._submit_detection(
+                            frame.copy() if self._owns_buffer(frame) else frame)
 
                 # FPS 계산 (1초 단위)
                 fps_frames += 1
                 elapsed = now - fps_start
+                fps = None
                 if elapsed >= 1.0:
-                    with self._lock:
-                        self._fps = fps_frames / elapsed
+                    fps = fps_frames / elapsed
                     fps_frames = 0
                     fps_start = now
 
-                # 콜백 호출
-                for cb in self._callbacks:
+                # 상태 갱신은 틱당 한 번의 락으로
+                self._check_thread(self._thread)
+                with self._lock:
+                    self._latest_frame = frame
+                    self._last_capture_time = time.time()
+                    self._frame_count += 1
+                    if fps is not None:
+                        self._fps = fps
+
+                # 콜백 호출 (락 없이 스냅샷 순회)
+                callbacks = self._callbacks
+                for cb in callbacks:
                     try:
                         cb(frame)
                     except Exception:
                         pass
 
-            time.sleep(self.interval)
+            # 데드라인 기반 스케줄링: 캡처/인식 시간만큼 주기가 밀리지 않도록
+            next_t += self.interval
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # 이미 늦었으면 따라잡기 없이 기준점 재설정
+                next_t = time.monotonic()
+
+    @staticmethod
+    def _check_thread(owner: Optional[threading.Thread]):
+        """THREAD_SAFETY_CHECKS=1 이면 공유 상태를 쓰는 쓰레드가 소유자인지 검사"""
+        if THREAD_SAFETY_CHECKS:
+            assert threading.current_thread() is owner, \
+                f"{threading.current_thread().name}: 소유하지 않은 상태 쓰기"
+
+    @staticmethod
+    def _frame_key(frame: np.ndarray) -> tuple:
+        """프레임 변경 감지용 지문 (4px 간격 샘플의 CRC32)"""
+        return frame.shape, zlib.crc32(frame[::4, ::4].tobytes())
+
+    def _submit_detection(self, frame: np.ndarray):
+        try:
+            self._detect_q.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._detect_q.put_nowait(frame)
+        except queue.Full:
+            pass
+
+    def _detect_loop(self):
+        while self._running:
+            try:
+                frame = self._detect_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            detections = ()
+            try:
+                detections = tuple(self.detector.detect_champions(frame))
+            except Exception as e:
+                logger.error(f"인식 오류: {e}")
+            self._check_thread(self._detect_thread)
+            with self._lock:
+                self._latest_detections = detections
+            self.new_detection_event.set()
+            for cb in self._detection_callbacks:
+                try:
+                    cb(frame, detections)
+                except Exception:
+                    pass
 
     def refresh_window(self):
-        """창 위치 다시 탐색"""
+        """창 위치 다시 탐색 (백그라운드). 찾기 전까지, 못 찾으면 전체 모니터 캡처.
+        탐색 중에 다시 호출되면 끝난 뒤 한 번 더 탐색한다."""
         self._window_region = None
+        with self._window_probe_lock:
+            self._window_probe_pending = True
+            if self._window_probe is not None:
+                return
+            self._window_probe = threading.Thread(
+                target=self._probe_window, name="window-probe", daemon=True)
+            self._window_probe.start()
+
+    def _probe_window(self):
+        while True:
+            with self._window_probe_lock:
+                if not self._window_probe_pending:
+                    self._window_probe = None
+                    return
+                self._window_probe_pending = False
+            self._window_region = _find_tft_window()
@@ -11,10 +11,14 @@ LLM_TIMEOUT = int(os.environ.get("LLM_TIMEOUT", "30"))
 CAPTURE_INTERVAL = float(os.environ.get("CAPTURE_INTERVAL", "2.0"))
 DETECTION_THRESHOLD = float(os.environ.get("DETECTION_THRESHOLD", "0.7"))
 TFT_WINDOW_TITLES = ["TFT", "Teamfight Tactics", "League of Legends"]
+# 캡처/인식 쓰레드 공유 상태 접근 검사 (free-threading 빌드 디버깅용)
+THREAD_SAFETY_CHECKS = os.environ.get("THREAD_SAFETY_CHECKS", "0") == "1"
 
 # 서버 설정
 HOST = "127.0.0.1"
 PORT = int(os.environ.get("PORT", "5000"))
+# 정적 파일(아이콘)을 X-Sendfile 헤더로 넘김 (nginx/Apache 등 지원 서버 뒤에서만 켤 것)
+USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "0") == "1"
 
 # 데이터 경로
 DATA_DIR = pathlib.Path(__file__).parent / "data"
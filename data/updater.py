@@ -1,11 +1,14 @@
 """롤체지지/메타 사이트 크롤링으로 데이터 자동 업데이트"""
 import json
 import logging
+import os
+import re
+import tempfile
 from datetime import datetime
 from pathlib import Path
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 from config import CHAMPIONS_JSON, META_JSON
 
@@ -18,6 +21,13 @@ HEADERS = {
     "Accept-Language": "ko-KR,ko;q=0.9",
 }
 
+# keep-alive 연결 재사용 (gzip 등 Content-Encoding 협상은 requests 기본값 사용)
+_session = requests.Session()
+_session.headers.update(HEADERS)
+
+# 덱 카드 노드만 트리로 만든다 (전체 DOM 생성 생략). class 여러 개인 경우도 매칭
+META_STRAINER = SoupStrainer("div", class_=re.compile(r"(^|\s)comp-card(\s|$)"))
+
 
 def update_meta(source_url: str = LOLCHESS_URL) -> dict:
     """
@@ -25,26 +35,36 @@ def update_meta(source_url: str = LOLCHESS_URL) -> dict:
     Returns: {"success": bool, "message": str, "updated_at": str}
     """
     try:
-        resp = requests.get(source_url, headers=HEADERS, timeout=15)
+        current = _read_meta()
+
+        # 같은 소스면 조건부 GET — 변경 없으면 304로 본문 없이 끝남
+        headers = {}
+        if current.get("source") == source_url:
+            if current.get("etag"):
+                headers["If-None-Match"] = current["etag"]
+            if current.get("last_modified"):
+                headers["If-Modified-Since"] = current["last_modified"]
+
+        resp = _session.get(source_url, headers=headers, timeout=15)
+        if resp.status_code == 304:
+            return {"success": True, "message": "메타 변경 없음",
+                    "updated_at": current.get("last_updated", "")}
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
+        # bytes 그대로 넘겨 인코딩 판별은 lxml에 맡김
+        soup = BeautifulSoup(resp.content, "lxml", parse_only=META_STRAINER)
 
         # 참고: 실제 파싱은 사이트 구조에 따라 조정 필요
         # 현재는 프레임워크만 구현
         decks = _parse_meta_decks(soup)
 
         if decks:
-            current = {}
-            if META_JSON.exists():
-                with open(META_JSON, "r", encoding="utf-8") as f:
-                    current = json.load(f)
-
             current["decks"] = decks
             current["last_updated"] = datetime.now().isoformat()
             current["source"] = source_url
+            current["etag"] = resp.headers.get("ETag", "")
+            current["last_modified"] = resp.headers.get("Last-Modified", "")
 
-            with open(META_JSON, "w", encoding="utf-8") as f:
-                json.dump(current, f, ensure_ascii=False, indent=2)
+            _write_meta(current)
 
             return {"success": True, "message": f"{len(decks)}개 덱 업데이트 완료",
                     "updated_at": current["last_updated"]}
@@ -56,6 +76,35 @@ def update_meta(source_url: str = LOLCHESS_URL) -> dict:
         return {"success": False, "message": f"크롤링 실패: {e}"}
 
 
+def _read_meta() -> dict:
+    try:
+        with open(META_JSON, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_meta(data: dict):
+    """임시 파일에 쓴 뒤 os.replace로 교체 (읽는 쪽이 쓰다 만 파일을 보지 않도록).
+    임시 파일은 호출마다 고유 이름 → 동시 업데이트가 같은 파일에 겹쳐 쓰지 않음"""
+    fd, tmp = tempfile.mkstemp(dir=META_JSON.parent, prefix=META_JSON.stem + ".",
+                               suffix=".json.tmp")
+    try:
+        # mkstemp는 0600으로 만들므로 일반 파일 권한으로
+        os.chmod(tmp, 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, META_JSON)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
 def _parse_meta_decks(soup: BeautifulSoup) -> list[dict]:
     """
     메타 덱 파싱 (사이트 구조에 따라 구현 필요).
@@ -1,31 +1,241 @@
 """TFT 덱 추천 엔진"""
+import heapq
 import json
-from typing import Optional, Union
+import logging
+import os
+import threading
+from collections import Counter
+from itertools import chain
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from config import CHAMPION_POOL, SHOP_ODDS, CHAMPIONS_JSON, META_JSON
 
+logger = logging.getLogger(__name__)
+
+# path → ((mtime_ns, size, inode), parsed). 파일이 바뀌지 않았으면 다시 파싱하지 않음
+# (mtime 해상도가 거친 파일시스템의 같은 틱 재작성 / os.replace 교체는 크기·inode로 감지)
+_json_cache: dict[str, tuple[tuple[int, int, int], Union[dict, list]]] = {}
+
 
 def _load_json(path) -> Optional[Union[dict, list]]:
+    key = os.fspath(path)
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        st = os.stat(key)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cached = _json_cache.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        if orjson is not None:
+            with open(key, "rb") as f:
+                data = orjson.loads(f.read())
+        else:
+            with open(key, "r", encoding="utf-8") as f:
+                data = json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         return None
+    _json_cache[key] = (stamp, data)
+    return data
+
+
+_ZERO_ODDS = (0,) * 5
+
+
+def _primary_cost(needed_costs: list[int]) -> int:
+    """가장 많이 필요한 코스트 (동률이면 낮은 코스트)"""
+    counts = Counter(needed_costs).most_common()
+    top = counts[0][1]
+    return min(cost for cost, n in counts if n == top)
+
+
+def _bit_positions(mask: int) -> list[int]:
+    """세트된 비트 번호 목록 (낮은 비트부터)"""
+    positions = []
+    while mask:
+        low = mask & -mask
+        positions.append(low.bit_length() - 1)
+        mask ^= low
+    return positions
+
+
+class _Tables(NamedTuple):
+    """로드한 데이터 + 파생 인덱스. 재로드 시 새로 만들어 통째 교체 (생성 후 불변)"""
+    champions_src: Optional[list]
+    meta_src: Optional[dict]
+    champions: list[dict]
+    meta_decks: list[dict]
+    # name → champion data lookup
+    champ_map: dict[str, dict]
+    # cost → champion names (코스트별 풀 합계 계산용)
+    by_cost: dict[int, tuple[str, ...]]
+    # 챔피언 인덱스 기반 배열 (풀 계산 벡터화용)
+    names: list[str]
+    idx: dict[str, int]
+    costs: np.ndarray
+    base_pool: np.ndarray
+    # 덱 매칭용 비트마스크. 비트 번호 = 챔피언 인덱스,
+    # 챔피언 데이터에 없는 코어 이름은 그 뒤 번호 (확률/잔여 0)
+    bit_names: list[str]
+    champ_bit: dict[str, int]
+    # 덱별 코어 비트 번호 (중복 제거, 오름차순)
+    deck_bits: list[tuple[int, ...]]
+    carry_champions: frozenset
+
+
+def _build_tables(champions_src, meta_src) -> _Tables:
+    champions = champions_src or []
+    meta_decks = (meta_src or {}).get("decks", [])
+    champ_map = {c["name"]: c for c in champions}
+    by_cost: dict[int, list[str]] = {}
+    for c in champions:
+        by_cost.setdefault(c["cost"], []).append(c["name"])
+    names = [c["name"] for c in champions]
+
+    bit_names = list(names)
+    champ_bit = {name: 1 << i for i, name in enumerate(names)}
+    deck_bits: list[tuple[int, ...]] = []
+    for deck in meta_decks:
+        mask = 0
+        for name in deck.get("core_champions", []):
+            bit = champ_bit.get(name)
+            if bit is None:
+                bit = champ_bit[name] = 1 << len(bit_names)
+                bit_names.append(name)
+            mask |= bit
+        deck_bits.append(tuple(_bit_positions(mask)))
+
+    # Determine carry champions from meta decks
+    # Higher cost (4+) champions in a deck are typically carries
+    high_cost_names = frozenset(
+        name for name, c in champ_map.items() if c.get("cost", 1) >= 4)
+    carry_champions = set()
+    for deck in meta_decks:
+        champs = deck.get("champions", deck.get("core_champions", []))
+        if len(champs) >= 2:
+            carry_champions.update(high_cost_names.intersection(champs))
+
+    return _Tables(
+        champions_src=champions_src,
+        meta_src=meta_src,
+        champions=champions,
+        meta_decks=meta_decks,
+        champ_map=champ_map,
+        by_cost={cost: tuple(names) for cost, names in by_cost.items()},
+        names=names,
+        idx={name: i for i, name in enumerate(names)},
+        costs=np.array([c["cost"] for c in champions], dtype=np.int8),
+        base_pool=np.array(
+            [CHAMPION_POOL.get(c["cost"], 0) for c in champions], dtype=np.int16),
+        bit_names=bit_names,
+        champ_bit=champ_bit,
+        deck_bits=deck_bits,
+        carry_champions=frozenset(carry_champions),
+    )
 
 
 class DeckRecommender:
     """메타 덱 기반 추천 엔진"""
 
-    def __init__(self):
-        self.champions = _load_json(CHAMPIONS_JSON) or []
-        self.meta_decks = (_load_json(META_JSON) or {}).get("decks", [])
-        # name → champion data lookup
-        self._champ_map = {c["name"]: c for c in self.champions}
+    def __init__(self, background: bool = False):
+        """background=True면 데이터 로드를 별도 쓰레드에서 진행 (생성 즉시 반환).
+        로드 전 호출된 조회 메서드는 로드 완료까지 대기한다."""
+        self._load_lock = threading.Lock()
+        self._ready = threading.Event()
+        # 로드 실패해도 조회가 빈 데이터로 동작하도록 기본값 먼저
+        self._tables = _build_tables(None, None)
+        # 테이블 교체 때마다 증가 (결과 캐시 키용)
+        self._generation = 0
+        if background:
+            threading.Thread(target=self._background_load, name="recommender-load",
+                             daemon=True).start()
+        else:
+            self.reload_data()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def generation(self) -> int:
+        """데이터 세대 번호. 테이블 교체 후 증가하므로
+        이 값을 먼저 읽고 조회한 결과는 최소 이 세대 이후 데이터 기준"""
+        return self._generation
+
+    @property
+    def champions(self) -> list[dict]:
+        return self._wait_tables().champions
+
+    @property
+    def meta_decks(self) -> list[dict]:
+        return self._wait_tables().meta_decks
+
+    def _wait_tables(self) -> _Tables:
+        """로드 완료까지 대기 후 현재 테이블 (호출 1회분은 이 참조 하나만 사용)"""
+        self._ready.wait()
+        return self._tables
 
     def reload_data(self):
-        self.champions = _load_json(CHAMPIONS_JSON) or []
-        self.meta_decks = (_load_json(META_JSON) or {}).get("decks", [])
-        self._champ_map = {c["name"]: c for c in self.champions}
+        try:
+            with self._load_lock:
+                self._reload_data()
+        finally:
+            self._ready.set()
+
+    def _background_load(self):
+        try:
+            self.reload_data()
+        except Exception:
+            logger.exception("추천 데이터 로드 실패 (빈 데이터로 동작)")
+
+    def _reload_data(self):
+        champions = _load_json(CHAMPIONS_JSON)
+        meta = _load_json(META_JSON)
+        # 두 파일 모두 캐시 그대로면 (파일 변경 없음) 인덱스 재구성 생략
+        current = self._tables
+        if (champions is not None and champions is current.champions_src
+                and meta is not None and meta is current.meta_src):
+            return
+        # 새 테이블을 다 만든 뒤 한 번에 교체 → 조회 중인 요청은 이전 테이블을 끝까지 사용
+        tables = _build_tables(champions, meta)
+        self._tables = tables
+        self._generation += 1
+
+    @staticmethod
+    def _pool_array(t: _Tables, opponent_champions: list[list[str]]) -> np.ndarray:
+        """챔피언 인덱스 순서의 잔여 수 배열"""
+        pool = t.base_pool.copy()
+        # 상대 보유 복사본을 이름별로 한 번에 집계 → 챔피언당 한 번만 차감
+        taken = Counter(chain.from_iterable(opponent_champions))
+        idx = t.idx
+        hits = [(idx[name], count) for name, count in taken.items() if name in idx]
+        if hits:
+            rows, counts = zip(*hits)
+            rows = list(rows)
+            pool[rows] = np.maximum(pool[rows] - np.array(counts), 0)
+        return pool
+
+    @staticmethod
+    def _cost_totals(t: _Tables, pool: np.ndarray) -> np.ndarray:
+        """코스트별 잔여 챔피언 총합 (인덱스 = 코스트)"""
+        totals = np.bincount(t.costs, weights=pool, minlength=len(CHAMPION_POOL) + 1)
+        return totals.astype(np.int64)
+
+    def _shop_probabilities(self, t: _Tables, pool: np.ndarray, level: int) -> np.ndarray:
+        """챔피언 인덱스 순서의 상점 등장 확률 (슬롯 1개 기준)"""
+        probs = np.zeros(len(pool), dtype=np.float64)
+        if level not in SHOP_ODDS or not len(pool):
+            return probs
+        odds = np.asarray(SHOP_ODDS[level], dtype=np.float64)[t.costs - 1]
+        totals = self._cost_totals(t, pool)[t.costs]
+        np.divide(pool, totals, out=probs, where=totals > 0)
+        probs *= odds
+        return probs
 
     def calculate_pool(self, opponent_champions: list[list[str]]) -> dict[str, int]:
         """
@@ -33,24 +243,25 @@ class DeckRecommender:
         opponent_champions: 각 상대의 챔피언 이름 리스트들
         Returns: {champion_name: remaining_copies}
         """
-        pool = {}
-        for champ in self.champions:
-            name = champ["name"]
-            cost = champ["cost"]
-            pool[name] = CHAMPION_POOL.get(cost, 0)
-
-        # 상대가 보유한 챔피언 제외 (각 복사본 1개씩)
-        for opp in opponent_champions:
-            for name in opp:
-                if name in pool:
-                    pool[name] = max(0, pool[name] - 1)
+        t = self._wait_tables()
+        pool = self._pool_array(t, opponent_champions)
+        return dict(zip(t.names, pool.tolist()))
 
-        return pool
+    def pool_cost_totals(self, pool: dict[str, int]) -> dict[int, int]:
+        """calculate_pool 결과로 코스트별 잔여 총합 {cost: total} 계산"""
+        return {cost: sum(pool.get(name, 0) for name in names)
+                for cost, names in self._wait_tables().by_cost.items()}
 
     def shop_probability(self, champion_name: str, level: int,
-                         pool: dict[str, int]) -> float:
-        """특정 챔피언이 상점에 등장할 확률 (슬롯 1개 기준)"""
-        champ = self._champ_map.get(champion_name)
+                         pool: dict[str, int],
+                         cost_totals=None) -> float:
+        """특정 챔피언이 상점에 등장할 확률 (슬롯 1개 기준).
+        cost_totals: 코스트별 잔여 총합 (pool_cost_totals(pool) 결과).
+            같은 pool로 여러 번 호출할 때는 한 번 계산해 넘길 것.
+            생략하면 해당 코스트 합계만 매번 새로 계산 (pool 직접 수정해도 안전).
+        """
+        t = self._wait_tables()
+        champ = t.champ_map.get(champion_name)
         if not champ or level not in SHOP_ODDS:
             return 0.0
 
@@ -61,10 +272,10 @@ class DeckRecommender:
             return 0.0
 
         # 해당 코스트 챔피언들의 총 잔여 수
-        total_in_cost = sum(
-            pool.get(c["name"], 0)
-            for c in self.champions if c["cost"] == cost
-        )
+        if cost_totals is None:
+            total_in_cost = sum(pool.get(name, 0) for name in t.by_cost.get(cost, ()))
+        else:
+            total_in_cost = int(cost_totals[cost])
         if total_in_cost == 0:
             return 0.0
 
@@ -73,47 +284,84 @@ class DeckRecommender:
 
     def recommend(self, my_champions: list[str],
                   opponent_champions: list[list[str]] = None,
-                  level: int = 7) -> list[dict]:
+                  level: int = 7, limit: Optional[int] = None) -> list[dict]:
         """
         덱 추천.
+        limit: 상위 N개만 필요할 때 지정 — 상한 점수로 순위권 밖 덱은 확률 계산 생략
         Returns: sorted list of {deck_name, tier, win_rate, match_rate,
                   needed_champions, completion_score, ...}
         """
         if opponent_champions is None:
             opponent_champions = []
-
-        pool = self.calculate_pool(opponent_champions)
-        my_set = set(my_champions)
+        if limit is not None and limit <= 0:
+            return []
+
+        # 재로드와 겹쳐도 한 요청은 같은 테이블만 보도록 한 번만 참조
+        t = self._wait_tables()
+        pool = self._pool_array(t, opponent_champions)
+        # 비트 번호 순서의 확률/잔여 배열 (미등록 이름 자리는 0)
+        bit_names = t.bit_names
+        n_bits = len(bit_names)
+        probs_all = np.zeros(n_bits, dtype=np.float64)
+        probs_all[:len(pool)] = self._shop_probabilities(t, pool, level)
+        pool_all = np.zeros(n_bits, dtype=np.int64)
+        pool_all[:len(pool)] = pool
+        # 응답용 값은 요청당 챔피언별로 한 번만 반올림/변환 (덱 × 필요 유닛마다 round 생략)
+        probs_display = [round(p, 4) for p in probs_all.tolist()]
+        remaining_all = pool_all.tolist()
+        champ_bit = t.champ_bit
+        my_mask = 0
+        for name in my_champions:
+            my_mask |= champ_bit.get(name, 0)
         results = []
 
-        for deck in self.meta_decks:
-            core = set(deck.get("core_champions", []))
-            total_needed = len(core)
+        # 루프 안 속성/전역 조회를 로컬로
+        results_append = results.append
+        prod = np.prod
+        # 현재까지 상위 limit개 점수 (min-heap)
+        top_scores: list[float] = []
+
+        for deck, core_bits in zip(t.meta_decks, t.deck_bits):
+            total_needed = len(core_bits)
             if total_needed == 0:
                 continue
 
-            owned = core & my_set
-            needed = core - my_set
-            match_rate = len(owned) / total_needed
+            # 코어를 한 번만 돌며 보유/필요로 분할 (보유 여부는 비트 검사)
+            owned_idx = []
+            needed_idx = []
+            for i in core_bits:
+                (owned_idx if my_mask >> i & 1 else needed_idx).append(i)
+            match_rate = len(owned_idx) / total_needed
+
+            # 획득 용이성 최대(1.0)로 잡아도 상위 limit개에 못 들면 생략
+            # (동점이면 먼저 나온 덱이 앞서므로 같아도 생략)
+            if limit is not None and len(top_scores) >= limit:
+                if round(match_rate * 0.6 + 0.4, 4) <= top_scores[0]:
+                    continue
 
             # 필요 챔피언별 상점 확률
-            needed_info = []
-            prob_product = 1.0
-            for name in needed:
-                prob = self.shop_probability(name, level, pool)
-                remaining = pool.get(name, 0)
-                needed_info.append({
-                    "name": name,
-                    "shop_probability": round(prob, 4),
-                    "remaining_in_pool": remaining,
-                })
-                prob_product *= (1 - prob)
+            probs = probs_all[needed_idx]
+            needed_info = [
+                {
+                    "name": bit_names[i],
+                    "shop_probability": probs_display[i],
+                    "remaining_in_pool": remaining_all[i],
+                }
+                for i in needed_idx
+            ]
+            prob_product = float(prod(1.0 - probs))
+            owned = [bit_names[i] for i in owned_idx]
 
             # 완성 가능성 스코어 (매칭률 + 획득 용이성)
-            acquisition_score = 1 - prob_product if needed else 1.0
-            completion_score = match_rate * 0.6 + acquisition_score * 0.4
-
-            results.append({
+            acquisition_score = 1 - prob_product if needed_idx else 1.0
+            completion_score = round(match_rate * 0.6 + acquisition_score * 0.4, 4)
+            if limit is not None:
+                if len(top_scores) < limit:
+                    heapq.heappush(top_scores, completion_score)
+                elif completion_score > top_scores[0]:
+                    heapq.heapreplace(top_scores, completion_score)
+
+            results_append({
                 "deck_name": deck.get("name", "Unknown"),
                 "tier": deck.get("tier", "?"),
                 "win_rate": deck.get("win_rate", 0),
@@ -123,10 +371,12 @@ class DeckRecommender:
                 "match_rate": round(match_rate, 2),
                 "owned_champions": sorted(owned),
                 "needed_champions": needed_info,
-                "completion_score": round(completion_score, 4),
+                "completion_score": completion_score,
             })
 
         results.sort(key=lambda r: -r["completion_score"])
+        if limit is not None:
+            del results[limit:]
         return results
 
     def get_shop_advice(self, my_champions: list[str],
@@ -146,56 +396,37 @@ class DeckRecommender:
         if opponent_champions is None:
             opponent_champions = []
 
-        pool = self.calculate_pool(opponent_champions)
-        my_set = set(my_champions)
+        t = self._wait_tables()
+        pool = dict(zip(t.names, self._pool_array(t, opponent_champions).tolist()))
         # Count owned copies for upgrade detection
-        my_counts: dict[str, int] = {}
-        for name in my_champions:
-            my_counts[name] = my_counts.get(name, 0) + 1
-
-        # Top 3 recommended decks
-        top_decks = recommended_decks[:3] if recommended_decks else []
-        secondary_decks = recommended_decks[3:] if len(recommended_decks) > 3 else []
-
-        # Build needed-champion sets per deck with role info
-        def _deck_needs(deck):
-            """Returns set of needed champion names for a deck"""
-            needed_names = set()
-            for ni in deck.get("needed_champions", []):
-                needed_names.add(ni["name"])
-            return needed_names
-
-        top_needed = {}  # champion -> deck info
-        for deck in top_decks:
-            for ni in deck.get("needed_champions", []):
-                name = ni["name"]
-                if name not in top_needed:
-                    top_needed[name] = deck
-
-        secondary_needed = {}
-        for deck in secondary_decks:
-            for ni in deck.get("needed_champions", []):
-                name = ni["name"]
-                if name not in secondary_needed and name not in top_needed:
-                    secondary_needed[name] = deck
-
-        # Determine carry champions from meta decks (last 2-3 champs in deck list are usually carries)
-        carry_champions = set()
-        for deck in self.meta_decks:
-            champs = deck.get("champions", deck.get("core_champions", []))
-            if len(champs) >= 2:
-                # Higher cost champions in the deck are typically carries
-                for cname in champs:
-                    c = self._champ_map.get(cname)
-                    if c and c.get("cost", 1) >= 4:
-                        carry_champions.add(cname)
+        my_counts = Counter(my_champions)
+        my_set = my_counts.keys()
+
+        # Top 3 recommended decks (recommend 결과는 이미 점수순 정렬)
+        recommended_decks = recommended_decks or []
+        top_decks = recommended_decks[:3]
+        secondary_decks = recommended_decks[3:]
+
+        # champion -> (deck, rank). rank 0 = top decks, 1 = secondary (top 우선)
+        # 상점에 나온 챔피언만 색인 (나머지 필요 챔피언은 조회될 일 없음)
+        shop_names = frozenset(shop_champions)
+        needed_index: dict[str, tuple[dict, int]] = {}
+        for rank, decks in ((0, top_decks), (1, secondary_decks)):
+            for deck in decks:
+                for ni in deck.get("needed_champions", []):
+                    name = ni["name"]
+                    if name in shop_names and name not in needed_index:
+                        needed_index[name] = (deck, rank)
+
+        carry_champions = t.carry_champions
 
         # Analyze each shop champion
         shop_advice = []
         core_missing_count = 0
 
+        champ_map = t.champ_map
         for shop_name in shop_champions:
-            champ = self._champ_map.get(shop_name)
+            champ = champ_map.get(shop_name)
             if not champ:
                 shop_advice.append({
                     "name": shop_name,
@@ -216,6 +447,7 @@ class DeckRecommender:
             emoji = "❌"
             reason = "추천 덱에 불필요"
             deck_name = ""
+            needed = needed_index.get(shop_name)
 
             # Check upgrade (already owned)
             if shop_name in my_set:
@@ -226,7 +458,7 @@ class DeckRecommender:
                     emoji = "⭐"
                     reason = f"{star}성 업그레이드 진행 ({count}/3)"
                     priority = 85 if shop_name in carry_champions else 70
-                    if shop_name in top_needed or shop_name in carry_champions:
+                    if (needed and needed[1] == 0) or shop_name in carry_champions:
                         priority = 95
                 elif count < 9:
                     star = 3 if count >= 3 else 2
@@ -236,8 +468,8 @@ class DeckRecommender:
                     priority = 80 if shop_name in carry_champions else 60
 
             # Check if needed in top decks
-            elif shop_name in top_needed:
-                deck = top_needed[shop_name]
+            elif needed and needed[1] == 0:
+                deck = needed[0]
                 deck_name = deck.get("deck_name", "")
                 is_carry = shop_name in carry_champions
                 if is_carry:
@@ -253,8 +485,8 @@ class DeckRecommender:
                 core_missing_count += 1
 
             # Check secondary decks
-            elif shop_name in secondary_needed:
-                deck = secondary_needed[shop_name]
+            elif needed:
+                deck = needed[0]
                 deck_name = deck.get("deck_name", "")
                 action = "consider"
                 emoji = "🤔"
@@ -284,11 +516,11 @@ class DeckRecommender:
 
         # Reroll advice
         reroll_advice = self._get_reroll_advice(
-            my_champions, top_decks, level, gold, pool, core_missing_count
+            my_champions, top_decks, level, gold, pool, core_missing_count, champ_map
         )
 
         # Level advice
-        level_advice = self._get_level_advice(level, gold, top_decks)
+        level_advice = self._get_level_advice(level, gold, top_decks, champ_map)
 
         return {
             "shop_advice": shop_advice,
@@ -297,7 +529,7 @@ class DeckRecommender:
         }
 
     def _get_reroll_advice(self, my_champions, top_decks, level, gold, pool,
-                           core_missing_count) -> dict:
+                           core_missing_count, champ_map) -> dict:
         """리롤 추천 여부 판단"""
         # Interest threshold
         if gold >= 50:
@@ -312,7 +544,7 @@ class DeckRecommender:
         needed_costs = []
         for deck in top_decks[:1]:  # Top deck
             for ni in deck.get("needed_champions", []):
-                champ = self._champ_map.get(ni["name"])
+                champ = champ_map.get(ni["name"])
                 if champ:
                     needed_costs.append(champ.get("cost", 1))
 
@@ -325,9 +557,9 @@ class DeckRecommender:
             }
 
         # Check shop odds for needed costs
-        odds = SHOP_ODDS.get(level, [0]*5)
+        odds = SHOP_ODDS.get(level, _ZERO_ODDS)
         avg_needed_cost = sum(needed_costs) / len(needed_costs)
-        primary_cost = max(set(needed_costs), key=needed_costs.count)
+        primary_cost = _primary_cost(needed_costs)
         cost_odds = odds[primary_cost - 1] if primary_cost <= 5 else 0
 
         if cost_odds < 0.10:
@@ -362,7 +594,7 @@ class DeckRecommender:
             "detail": f"핵심 유닛 {core_missing_count}개 부족, {primary_cost}코 확률 {cost_odds*100:.0f}%",
         }
 
-    def _get_level_advice(self, level, gold, top_decks) -> dict:
+    def _get_level_advice(self, level, gold, top_decks, champ_map) -> dict:
         """레벨업 vs 리롤 조언"""
         if level >= 9:
             return {"should_level": False, "reason": "이미 고레벨 — 리롤로 덱 완성"}
@@ -371,16 +603,16 @@ class DeckRecommender:
         needed_costs = []
         for deck in top_decks[:1]:
             for ni in deck.get("needed_champions", []):
-                champ = self._champ_map.get(ni["name"])
+                champ = champ_map.get(ni["name"])
                 if champ:
                     needed_costs.append(champ.get("cost", 1))
 
         if not needed_costs:
             return {"should_level": True, "reason": "덱 거의 완성 — 레벨업으로 전투력 강화"}
 
-        primary_cost = max(set(needed_costs), key=needed_costs.count)
-        current_odds = SHOP_ODDS.get(level, [0]*5)
-        next_odds = SHOP_ODDS.get(level + 1, [0]*5)
+        primary_cost = _primary_cost(needed_costs)
+        current_odds = SHOP_ODDS.get(level, _ZERO_ODDS)
+        next_odds = SHOP_ODDS.get(level + 1, _ZERO_ODDS)
 
         curr_pct = current_odds[primary_cost - 1] if primary_cost <= 5 else 0
         next_pct = next_odds[primary_cost - 1] if primary_cost <= 5 else 0
@@ -1,13 +1,25 @@
 """OpenAI 호환 LLM API 클라이언트 + 룰 기반 폴백"""
+import json
 import logging
-from typing import Optional
+import time
+from typing import Iterator, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
 from config import LLM_API_URL, LLM_MODEL, LLM_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
+# 서버 연결 확인 결과 재사용 시간(초)
+AVAILABILITY_TTL = 10.0
+
 SYSTEM_PROMPT = """당신은 TFT(전략적 팀 전투) 전문 코치입니다.
 현재 게임 상황을 분석하고, 최적의 전략을 한국어로 조언해주세요.
 다음 형식으로 답변하세요:
@@ -69,15 +81,32 @@ class LLMClient:
         self.model = model or LLM_MODEL
         self.timeout = LLM_TIMEOUT
         self._available: Optional[bool] = None
+        self._available_at: float = 0.0
+        self._available_url: str = ""
+        # keep-alive 연결 재사용 (요청마다 TCP/TLS 핸드셰이크 방지)
+        self._session = requests.Session()
+        self._session.headers.update({"Connection": "keep-alive"})
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
 
     def is_available(self) -> bool:
-        """LLM 서버 연결 확인"""
+        """LLM 서버 연결 확인 (AVAILABILITY_TTL 동안 결과 재사용)"""
+        if (self._available is not None and self._available_url == self.api_url
+                and time.monotonic() - self._available_at < AVAILABILITY_TTL):
+            return self._available
         try:
-            resp = requests.get(f"{self.api_url}/models", timeout=5)
-            self._available = resp.status_code == 200
+            resp = self._session.get(f"{self.api_url}/models", timeout=(1.0, 5))
+            available = resp.status_code == 200
         except Exception:
-            self._available = False
-        return self._available
+            available = False
+        self._set_available(available)
+        return available
+
+    def _set_available(self, available: bool):
+        self._available = available
+        self._available_at = time.monotonic()
+        self._available_url = self.api_url
 
     def analyze_game(self, my_champions: list[str],
                      recommendations: list[dict],
@@ -87,9 +116,11 @@ class LLMClient:
         게임 상황 분석 요청.
         Returns: {"analysis": str, "source": "llm"|"rule"}
         """
-        # LLM 시도
-        llm_result = self._try_llm(my_champions, recommendations,
-                                    opponent_info, level, gold)
+        # LLM 시도 (최근 연결 실패한 서버면 바로 폴백)
+        llm_result = None
+        if self.is_available():
+            llm_result = self._try_llm(my_champions, recommendations,
+                                        opponent_info, level, gold)
         if llm_result:
             return {"analysis": llm_result, "source": "llm"}
 
@@ -97,9 +128,43 @@ class LLMClient:
         rule_result = rule_based_advice(my_champions, level, gold, recommendations)
         return {"analysis": rule_result, "source": "rule"}
 
+    def analyze_game_stream(self, my_champions: list[str],
+                            recommendations: list[dict],
+                            opponent_info: str = "",
+                            level: int = 7, gold: int = 0) -> Iterator[dict]:
+        """
+        게임 상황 분석 (스트리밍).
+        Yields: {"delta": str} 조각들, 마지막에 {"source": "llm"|"rule"}
+        """
+        streamed = False
+        if self.is_available():
+            context = self._build_context(my_champions, recommendations,
+                                          opponent_info, level, gold)
+            try:
+                for chunk in self._chat_stream(context):
+                    streamed = True
+                    yield {"delta": chunk}
+            except Exception as e:
+                logger.warning(f"LLM 스트리밍 실패: {e}")
+                self._set_available(False)
+        if streamed:
+            yield {"source": "llm"}
+            return
+
+        # 폴백: 룰 기반
+        yield {"delta": rule_based_advice(my_champions, level, gold, recommendations)}
+        yield {"source": "rule"}
+
     def _try_llm(self, my_champions, recommendations,
                  opponent_info, level, gold) -> Optional[str]:
         """LLM API 호출 시도"""
+        context = self._build_context(my_champions, recommendations,
+                                      opponent_info, level, gold)
+        return self._chat(context)
+
+    @staticmethod
+    def _build_context(my_champions, recommendations,
+                       opponent_info, level, gold) -> str:
         context = f"""현재 상황:
 - 레벨: {level}, 골드: {gold}
 - 내 챔피언: {', '.join(my_champions) if my_champions else '없음'}
@@ -116,28 +181,56 @@ class LLMClient:
             if needed:
                 context += f" - 필요: {', '.join(needed)}"
             context += "\n"
-
-        return self._chat(context)
+        return context
+
+    def _chat_payload(self, user_message: str, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_message},
+            ],
+            "temperature": 0.7,
+            "max_tokens": 1024,
+            "stream": stream,
+        }
 
     def _chat(self, user_message: str) -> Optional[str]:
         """채팅 완성 API 호출"""
         try:
-            resp = requests.post(
+            resp = self._session.post(
                 f"{self.api_url}/chat/completions",
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": user_message},
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1024,
-                },
-                timeout=self.timeout,
+                json=self._chat_payload(user_message, stream=False),
+                timeout=(1.0, self.timeout),
+                stream=False,
             )
             resp.raise_for_status()
-            data = resp.json()
+            data = _loads(resp.content)
             return data["choices"][0]["message"]["content"]
         except Exception as e:
             logger.warning(f"LLM 요청 실패: {e}")
+            self._set_available(False)
             return None
+
+    def _chat_stream(self, user_message: str) -> Iterator[str]:
+        """채팅 완성 API 스트리밍 호출 (SSE). content 조각을 도착 순서대로 yield"""
+        with self._session.post(
+            f"{self.api_url}/chat/completions",
+            json=self._chat_payload(user_message, stream=True),
+            timeout=(1.0, self.timeout),
+            stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            # text/event-stream은 charset 없이 오는 경우가 많음 (기본값 latin-1 방지)
+            resp.encoding = "utf-8"
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                choices = _loads(payload).get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
@@ -5,6 +5,7 @@ import logging
 import os
 import signal
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.dirname(__file__))
 
@@ -27,11 +28,9 @@ def main():
     # 로깅
     level = logging.DEBUG if args.debug else logging.INFO
     logging.basicConfig(level=level, format="%(asctime)s [%(name)s] %(message)s")
-    logger = logging.getLogger("tft-guide")
 
-    # detector 초기화
-    detector = ChampionDetector(threshold=args.threshold)
-    logger.info(f"🎯 템플릿 {detector.template_count}개 로드")
+    # detector 초기화 (템플릿은 백그라운드 로드 → 서버 바로 시작)
+    detector = ChampionDetector(threshold=args.threshold, background=True)
 
     # 캡처 설정
     capture = None
@@ -43,22 +42,30 @@ def main():
             debug_dir = os.path.join(os.path.dirname(__file__), "debug_output")
             os.makedirs(debug_dir, exist_ok=True)
             frame_idx = [0]
-
-            def save_debug(frame):
-                detections = capture.latest_detections
-                if detections:
-                    img = frame.copy()
-                    for d in detections:
-                        x, y = d["position"]
-                        w, h = d.get("size", (48, 48))
-                        cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                        cv2.putText(img, f"{d['name_kr']} {d['confidence']:.2f}",
-                                    (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1)
-                    path = os.path.join(debug_dir, f"frame_{frame_idx[0]:04d}.png")
-                    cv2.imwrite(path, img)
-                    frame_idx[0] += 1
-
-            capture.on_frame(save_debug)
+            # PNG 인코딩/저장은 별도 워커에서 (캡처 쓰레드 블로킹 방지, 바쁘면 프레임 버림)
+            debug_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-save")
+            pending = [None]
+
+            def write_debug(img, detections):
+                for d in detections:
+                    x, y = d["position"]
+                    w, h = d.get("size", (48, 48))
+                    cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0, 255), 2)
+                    cv2.putText(img, f"{d['name_kr']} {d['confidence']:.2f}",
+                                (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0, 255), 1)
+                path = os.path.join(debug_dir, f"frame_{frame_idx[0]:04d}.png")
+                cv2.imwrite(path, img)
+                frame_idx[0] += 1
+
+            def save_debug(frame, detections):
+                # 인식에 쓴 프레임과 그 결과를 함께 받음 (다른 프레임 결과와 섞이지 않도록)
+                if not detections:
+                    return
+                if pending[0] is not None and not pending[0].done():
+                    return
+                pending[0] = debug_pool.submit(write_debug, frame.copy(), detections)
+
+            capture.on_detection(save_debug)
 
     # Flask 앱
     app = create_app(capture=capture, detector=detector, llm_url=args.llm_url)
@@ -79,7 +86,8 @@ def main():
     print(f"  🌐 http://localhost:{args.port}")
     print(f"  📸 {mode}")
     print(f"  🤖 LLM: {args.llm_url}")
-    print(f"  🎯 템플릿: {detector.template_count}개\n")
+    templates = f"{detector.template_count}개" if detector.ready else "로딩 중"
+    print(f"  🎯 템플릿: {templates}\n")
 
     # 캡처 자동 시작
     if capture:
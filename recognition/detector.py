@@ -1,12 +1,21 @@
 """OpenCV 기반 챔피언 인식 모듈 - 최적화 버전"""
 import json
 import logging
+import os
 import pathlib
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 import cv2
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 from config import CHAMPIONS_JSON
 
 logger = logging.getLogger(__name__)
@@ -24,6 +33,31 @@ REGIONS = {
 # 템플릿 표준 크기 (매칭 속도 최적화)
 TEMPLATE_SIZE = (32, 32)
 
+# coarse-to-fine: 1/2 해상도에서 느슨한 임계값으로 후보를 찾고
+# 후보 주변만 원본 해상도로 다시 매칭 (축소 템플릿이 이보다 작으면 전체 탐색)
+COARSE_MIN_SIZE = 12
+COARSE_THRESHOLD_RATIO = 0.8
+# 거친 좌표 ×2 주변 재탐색 여유 (픽셀)
+REFINE_PAD = 2
+# 가까운 후보끼리 닫힘 연산으로 합쳐 ROI(= matchTemplate 호출) 수를 줄임.
+# 1/2 해상도 마스크에 적용하므로 3x3 = 원본 약 5x5 (정사각 all-ones 커널이 타원보다 빠름)
+_MERGE_KERNEL = np.ones((3, 3), np.uint8)
+# 거친 단계에서 창 평균 밝기가 템플릿 평균과 이보다 많이 다르면 후보 제외 (None = 끔).
+# NCC 자체는 밝기 불변이라 켜면 어두워진 아이콘(골드 부족 상점 등)을 놓칠 수 있음.
+# 거친 단계가 이미 대부분 걸러내서, 놓치지 않는 허용치(64+)에서는 이득이 거의 없음
+MEAN_TOLERANCE: Optional[float] = None
+
+# 인식 기준 화면 폭. 입력 폭이 이 비율 이내로 다르면 리사이즈 생략
+TARGET_WIDTH = 1920
+RESIZE_TOLERANCE = 0.03
+
+# 템플릿 매칭 쓰레드 수
+DETECT_WORKERS = min(os.cpu_count() or 1, 8)
+
+# 같은 챔피언 중복 박스 제거 IoU 기준
+NMS_IOU_THRESHOLD = 0.3
+_NO_HITS = (np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.float32))
+
 
 def _load_champion_map() -> dict:
     mapping = {}
@@ -43,47 +77,208 @@ def _load_champion_map() -> dict:
     return mapping
 
 
-def _nms_boxes(detections: list, iou_threshold: float = 0.3) -> list:
-    if not detections:
-        return []
-    detections.sort(key=lambda d: -d["confidence"])
-    kept = []
-    for det in detections:
-        x1, y1 = det["position"]
-        w1, h1 = det.get("size", (32, 32))
-        suppress = False
-        for k in kept:
-            x2, y2 = k["position"]
-            w2, h2 = k.get("size", (32, 32))
-            ix1, iy1 = max(x1, x2), max(y1, y2)
-            ix2, iy2 = min(x1+w1, x2+w2), min(y1+h1, y2+h2)
-            if ix2 > ix1 and iy2 > iy1:
-                inter = (ix2-ix1) * (iy2-iy1)
-                union = w1*h1 + w2*h2 - inter
-                if union > 0 and inter/union > iou_threshold:
-                    suppress = True
-                    break
-        if not suppress:
-            kept.append(det)
-    return kept
+def _cuda_available() -> bool:
+    """CUDA 빌드 OpenCV + GPU 장치가 있을 때만 True"""
+    try:
+        return (cv2.cuda.getCudaEnabledDeviceCount() > 0
+                and hasattr(cv2.cuda, "createTemplateMatching"))
+    except (AttributeError, cv2.error):
+        return False
+
+
+def _region_rect(roi: dict, h: int, w: int) -> tuple[int, int, int, int]:
+    """영역 비율 → 픽셀 좌표 (x1, y1, x2, y2)"""
+    return (int(w * roi["x"]), int(h * roi["y"]),
+            int(w * (roi["x"] + roi["w"])), int(h * (roi["y"] + roi["h"])))
+
+
+def _window_stats(crop: np.ndarray, th: int, tw: int) -> tuple[np.ndarray, np.ndarray]:
+    """매칭 위치별 창의 (평균 제거) 제곱합의 제곱근과 평균 밝기.
+    crop 적분 영상을 한 번만 계산해 모든 템플릿이 공유한다."""
+    s, sq = cv2.integral2(crop, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    rh = crop.shape[0] - th + 1
+    rw = crop.shape[1] - tw + 1
+    win = s[th:, tw:] - s[:rh, tw:] - s[th:, :rw] + s[:rh, :rw]
+    win2 = sq[th:, tw:] - sq[:rh, tw:] - sq[th:, :rw] + sq[:rh, :rw]
+    area = th * tw
+    norms = np.sqrt(np.maximum(win2 - win * win / area, 0)).astype(np.float32)
+    return norms, (win / area).astype(np.float32)
+
+
+def _make_bank(grays: dict[str, np.ndarray]) -> tuple[tuple[str, ...], np.ndarray, np.ndarray]:
+    """같은 크기 템플릿들을 (이름들, 평균 제거 + 단위 노름 float32 스택, 평균 밝기) 로 묶음.
+    crop과의 상관값 = NCC 분자 / 템플릿 노름"""
+    names, units, means = [], [], []
+    for api_name, gray in grays.items():
+        centered = gray.astype(np.float64) - gray.mean()
+        norm = np.sqrt((centered * centered).sum())
+        if norm < 1e-6:
+            # 단색 템플릿은 어디서나 같은 점수라 판별력 없음
+            logger.debug(f"단색 템플릿 제외: {api_name} {gray.shape}")
+            continue
+        names.append(api_name)
+        units.append((centered / norm).astype(np.float32))
+        means.append(gray.mean())
+    return (tuple(names), (np.stack(units) if units else None),
+            np.array(means, dtype=np.float32))
+
+
+def _refine_candidates(crop_f: np.ndarray, tmpl: np.ndarray, cand: np.ndarray,
+                       wnd_thr: np.ndarray, wnd_max: np.ndarray) -> tuple:
+    """거친 단계 후보(cand, 1/2 해상도 uint8 마스크) 주변 ROI에서만 원본 해상도로 매칭.
+    Returns: (ys, xs, 상관값) — 원본 결과 좌표, 전체 탐색과 같은 행 우선 순서"""
+    if not cv2.countNonZero(cand):
+        return _NO_HITS
+    rh, rw = wnd_thr.shape
+    th, tw = tmpl.shape
+    # 병합/연결 요소 분석은 1/2 해상도, 후보가 있는 경계 상자 안에서만 하고
+    # 결과 상자만 원본 좌표로 옮김
+    bx, by, bw, bh = cv2.boundingRect(cand)
+    mask = cv2.morphologyEx(cand[by:by + bh, bx:bx + bw], cv2.MORPH_CLOSE, _MERGE_KERNEL)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    flat_idx, scores = [], []
+    for cx, cy, cw, ch, _ in stats[1:]:
+        cx += bx
+        cy += by
+        y0 = max(cy * 2 - REFINE_PAD, 0)
+        x0 = max(cx * 2 - REFINE_PAD, 0)
+        y1 = min((cy + ch - 1) * 2 + REFINE_PAD + 1, rh)
+        x1 = min((cx + cw - 1) * 2 + REFINE_PAD + 1, rw)
+        if y0 >= y1 or x0 >= x1:
+            continue
+        res = cv2.matchTemplate(crop_f[y0:y1 + th - 1, x0:x1 + tw - 1], tmpl, cv2.TM_CCORR)
+        ry, rx = np.nonzero((res >= wnd_thr[y0:y1, x0:x1]) & (res < wnd_max[y0:y1, x0:x1]))
+        if len(ry):
+            flat_idx.append((ry + y0) * rw + (rx + x0))
+            scores.append(res[ry, rx])
+    if not flat_idx:
+        return _NO_HITS
+    # ROI 경계 상자가 겹칠 수 있으므로 중복 제거 (unique = 행 우선 정렬)
+    flat_idx, first = np.unique(np.concatenate(flat_idx), return_index=True)
+    ys, xs = np.divmod(flat_idx, rw)
+    return ys, xs, np.concatenate(scores)[first]
+
+
+def _nms_keep_numpy(boxes: np.ndarray, order: np.ndarray, iou_threshold: float) -> list:
+    """order 순 greedy NMS (벡터화). 남은 후보와의 IoU를 한 번에 계산"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])
+        ih = np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])
+        inter = np.where((iw > 0) & (ih > 0), iw * ih, 0.0)
+        union = areas[i] + areas[rest] - inter
+        overlap = (inter > 0) & (union > 0)
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=overlap)
+        order = rest[iou <= iou_threshold]
+    return keep
+
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def _nms_keep_numba(boxes, order, iou_threshold):
+        """_nms_keep_numpy와 같은 결과 (기존 kept 목록과만 비교하는 greedy 루프)"""
+        n = order.shape[0]
+        keep = np.empty(n, np.int64)
+        n_keep = 0
+        for a in range(n):
+            i = order[a]
+            ax1, ay1, ax2, ay2 = boxes[i, 0], boxes[i, 1], boxes[i, 2], boxes[i, 3]
+            area_a = (ax2 - ax1) * (ay2 - ay1)
+            suppress = False
+            for b in range(n_keep):
+                k = keep[b]
+                iw = min(ax2, boxes[k, 2]) - max(ax1, boxes[k, 0])
+                ih = min(ay2, boxes[k, 3]) - max(ay1, boxes[k, 1])
+                if iw > 0 and ih > 0:
+                    inter = iw * ih
+                    union = area_a + (boxes[k, 2] - boxes[k, 0]) * (boxes[k, 3] - boxes[k, 1]) - inter
+                    if union > 0 and inter / union > iou_threshold:
+                        suppress = True
+                        break
+            if not suppress:
+                keep[n_keep] = i
+                n_keep += 1
+        return keep[:n_keep]
+
+    def _nms_keep(boxes, order, iou_threshold):
+        return _nms_keep_numba(boxes, order, iou_threshold).tolist()
+else:
+    _nms_keep = _nms_keep_numpy
 
 
 class ChampionDetector:
     """챔피언 아이콘 템플릿 매칭 감지기 (최적화 버전)"""
 
-    def __init__(self, threshold: float = 0.7, scales: list = None):
+    # BGRA 입력을 직접 받음 (캡처 쪽 BGRA→BGR 변환 생략, 그레이 변환 한 번으로 처리)
+    input_channels = 4
+
+    def __init__(self, threshold: float = 0.7, scales: list = None,
+                 background: bool = False, use_cuda: Optional[bool] = None):
+        """scales: TEMPLATE_SIZE 대비 템플릿 배율 목록 (기본 1.0 하나).
+        background=True면 템플릿을 별도 쓰레드에서 로드 (생성 즉시 반환).
+        로드 완료 전 인식 요청은 빈 결과를 돌려준다.
+        use_cuda: 거친 단계 매칭을 GPU에서 (None = 가능하면 자동 사용)"""
         self.threshold = threshold
+        self._scales = tuple(scales) if scales else (1.0,)
+        self._use_cuda = _cuda_available() if use_cuda is None else (use_cuda and _cuda_available())
+        self._gpu_matcher = None
+        # 템플릿 매칭 병렬화용 (코어 1개면 순차 실행)
+        self._pool = (ThreadPoolExecutor(max_workers=DETECT_WORKERS, thread_name_prefix="match")
+                      if DETECT_WORKERS > 1 else None)
         # 그레이스케일 + 고정 크기 템플릿 (사전 처리)
         self._templates: dict[str, np.ndarray] = {}
+        # 배율별 매칭용 템플릿 묶음 (로드 시 한 번만 리사이즈):
+        # ((tw, th), 이름들, 평균 제거 + 단위 노름 float32 스택 (N, th, tw),
+        #  1/2 해상도 스택 또는 None, 1/2 해상도 템플릿 평균 밝기 또는 None,
+        #  GPU에 올린 1/2 해상도 템플릿 목록 또는 None)
+        self._bank: tuple[tuple[tuple[int, int], tuple[str, ...], np.ndarray,
+                                Optional[np.ndarray], Optional[np.ndarray],
+                                Optional[list]], ...] = ()
         self._champion_map: dict = {}
-        self._load_templates()
+        # (h, w) → 기본 REGIONS 픽셀 좌표 (프레임 크기는 사실상 고정이라 한 번만 계산)
+        self._region_rects: dict[tuple[int, int], dict[str, tuple[int, int, int, int]]] = {
+            (1080, 1920): {name: _region_rect(roi, 1080, 1920) for name, roi in REGIONS.items()}}
+        self._local = threading.local()
+        # 영역 이름 → (crop 키, 템플릿 묶음, 후보). 변하지 않은 영역은 매칭 생략
+        self._region_cache: dict[str, tuple[tuple, tuple, list]] = {}
+        self._ready = threading.Event()
+        if background:
+            threading.Thread(target=self._load, name="template-load",
+                             daemon=True).start()
+        else:
+            self._load()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _load(self):
+        try:
+            self._load_templates()
+        finally:
+            self._ready.set()
 
     def _load_templates(self):
+        # 다 만든 뒤 한 번에 교체 (로드 중 인식 쓰레드가 반쯤 찬 dict를 보지 않도록)
         self._champion_map = _load_champion_map()
         if not ICONS_DIR.exists():
             logger.warning(f"아이콘 디렉토리 없음: {ICONS_DIR}")
             return
 
+        tw, th = TEMPLATE_SIZE
+        sizes = []
+        for s in self._scales:
+            size = (max(1, int(tw * s)), max(1, int(th * s)))
+            if size not in sizes:
+                sizes.append(size)
+        templates: dict[str, np.ndarray] = {}
+        by_size: dict[tuple[int, int], dict[str, np.ndarray]] = {size: {} for size in sizes}
         count = 0
         for f in ICONS_DIR.glob("TFT16_*.png"):
             api_name = f.stem.replace("TFT16_", "")
@@ -92,9 +287,42 @@ class ChampionDetector:
                 # 표준 크기로 리사이즈 + 그레이스케일 (사전 처리)
                 resized = cv2.resize(img, TEMPLATE_SIZE)
                 gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
-                self._templates[api_name] = gray
+                templates[api_name] = gray
+                for size, grays in by_size.items():
+                    if size != TEMPLATE_SIZE:
+                        resized = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+                        grays[api_name] = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
+                    else:
+                        grays[api_name] = gray
                 count += 1
 
+        bank = []
+        for size, grays in by_size.items():
+            names, stack, _ = _make_bank(grays)
+            if not names:
+                continue
+            # 1/2 해상도 템플릿 (거친 단계용). 하나라도 단색이 되면 이 배율은 전체 탐색
+            coarse = coarse_means = None
+            if min(size) // 2 >= COARSE_MIN_SIZE:
+                coarse_names, coarse, coarse_means = _make_bank(
+                    {name: cv2.pyrDown(grays[name]) for name in names})
+                if coarse_names != names:
+                    coarse = coarse_means = None
+            # GPU는 거친 단계(1/2 해상도 전체 crop)만 담당. 정밀 단계는 작은 ROI라
+            # 전송 비용이 더 커서 CPU에 둠
+            gpu_coarse = None
+            if coarse is not None and self._use_cuda:
+                gpu_coarse = []
+                for t in coarse:
+                    g = cv2.cuda_GpuMat()
+                    g.upload(t)
+                    gpu_coarse.append(g)
+            bank.append((size, names, stack, coarse, coarse_means, gpu_coarse))
+        if self._use_cuda and self._gpu_matcher is None:
+            self._gpu_matcher = cv2.cuda.createTemplateMatching(cv2.CV_32F, cv2.TM_CCORR)
+        self._bank = tuple(bank)
+        self._templates = templates
+
         logger.info(f"템플릿 {count}개 로드 완료 (매핑: {len(self._champion_map)}개)")
 
     def set_threshold(self, threshold: float):
@@ -103,62 +331,173 @@ class ChampionDetector:
     def detect_champions(self, image: np.ndarray,
                          regions: dict = None) -> list:
         """이미지에서 챔피언 감지 (최적화: 그레이스케일 + 고정크기)"""
-        if not self._templates:
+        bank = self._bank
+        if not bank:
             return []
         if regions is None:
             regions = REGIONS
+        # 다른 쓰레드의 set_threshold와 무관하게 한 번의 인식은 같은 임계값 사용
+        threshold = self.threshold
 
         h, w = image.shape[:2]
-        # 1920x1080 기준으로 리사이즈
-        target_w = 1920
-        if w != target_w:
-            scale_f = target_w / w
-            image = cv2.resize(image, (target_w, int(h * scale_f)))
+        # 1920x1080 기준으로 리사이즈 (폭 차이가 허용치 이내면 생략 — 영역은 비율이라 무관)
+        if abs(w - TARGET_WIDTH) > TARGET_WIDTH * RESIZE_TOLERANCE:
+            size = (TARGET_WIDTH, int(h * (TARGET_WIDTH / w)))
+            # 프레임 크기는 사실상 고정이므로 쓰레드별 출력 버퍼 재사용
+            buf = getattr(self._local, "resize_buf", None)
+            if buf is None or buf.shape[1::-1] != size or buf.shape[2:] != image.shape[2:]:
+                buf = self._local.resize_buf = np.empty((size[1], size[0]) + image.shape[2:],
+                                                        dtype=image.dtype)
+            image = cv2.resize(image, size, dst=buf)
             h, w = image.shape[:2]
 
-        # 전체 이미지를 그레이스케일로 한번만 변환
-        gray_full = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        all_detections = []
+        # 전체 이미지를 그레이스케일로 한번만 변환 (BGR / BGRA 모두 지원)
+        if image.ndim == 3 and image.shape[2] == 4:
+            gray_full = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+        else:
+            gray_full = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        # 후보는 열 단위(SoA)로 모으고 NMS 통과분만 dict로 만든다.
+        # groups[k] = (api_name, size, region_name), owners = 후보별 그룹 번호
+        xs_buf, ys_buf, conf_buf, owner_buf = [], [], [], []
+        groups: list[tuple[str, tuple[int, int], str]] = []
+        rects = self._region_rects.get((h, w))
+        if rects is None:
+            rects = self._region_rects[(h, w)] = {
+                name: _region_rect(roi, h, w) for name, roi in REGIONS.items()}
 
         for region_name, roi in regions.items():
-            x1 = int(w * roi["x"])
-            y1 = int(h * roi["y"])
-            x2 = int(w * (roi["x"] + roi["w"]))
-            y2 = int(h * (roi["y"] + roi["h"]))
+            # 기본 영역이면 캐시된 좌표, 아니면 직접 계산. crop은 복사 없는 view
+            if roi is REGIONS.get(region_name):
+                x1, y1, x2, y2 = rects[region_name]
+            else:
+                x1, y1, x2, y2 = _region_rect(roi, h, w)
             crop = gray_full[y1:y2, x1:x2]
 
             if crop.size == 0:
                 continue
 
-            crop_h, crop_w = crop.shape[:2]
-            tw, th = TEMPLATE_SIZE
-
+            # 직전 프레임과 같은 crop이면 (상점/벤치는 대부분 그대로) 매칭 생략
+            key = (x1, y1, x2, y2, threshold, zlib.crc32(np.ascontiguousarray(crop)))
+            cached = self._region_cache.get(region_name)
+            if cached is not None and cached[0] == key and cached[1] is bank:
+                hits = cached[2]
+            else:
+                hits = self._match_region(crop, x1, y1, bank, threshold)
+                self._region_cache[region_name] = (key, bank, hits)
+
+            for api_name, size, xs, ys, confs in hits:
+                xs_buf.append(xs)
+                ys_buf.append(ys)
+                conf_buf.append(confs)
+                owner_buf.append(np.full(len(xs), len(groups), np.intp))
+                groups.append((api_name, size, region_name))
+
+        if not groups:
+            return []
+        xs = np.concatenate(xs_buf).tolist()
+        ys = np.concatenate(ys_buf).tolist()
+        # 응답 값과 같은 반올림 신뢰도로 정렬 (동률 처리 포함 기존 결과와 동일)
+        confs = [round(c, 4) for c in np.concatenate(conf_buf).tolist()]
+        owners = np.concatenate(owner_buf)
+
+        sizes = np.array([g[1] for g in groups], dtype=np.float64)[owners]
+        boxes = np.empty((len(owners), 4), dtype=np.float64)
+        boxes[:, 0] = xs
+        boxes[:, 1] = ys
+        boxes[:, 2:] = boxes[:, :2] + sizes
+        order = np.argsort(-np.array(confs), kind="stable")
+
+        detections = []
+        owners = owners.tolist()
+        for i in _nms_keep(boxes, order, NMS_IOU_THRESHOLD):
+            api_name, size, region_name = groups[owners[i]]
+            info = self._champion_map.get(api_name, {})
+            detections.append({
+                "name": info.get("name", api_name),
+                "name_kr": info.get("name_kr", api_name),
+                "apiName": api_name,
+                "position": (xs[i], ys[i]),
+                "size": size,
+                "confidence": confs[i],
+                "area": region_name,
+                "cost": info.get("cost", 1),
+            })
+        return detections
+
+    def _match_region(self, crop: np.ndarray, x1: int, y1: int,
+                      bank: tuple, threshold: float) -> list:
+        """crop 한 영역의 템플릿 매칭 후보.
+        Returns: [(api_name, size, xs, ys, confs)] — 좌표는 전체 프레임 기준"""
+        hits = []
+        crop_h, crop_w = crop.shape[:2]
+        crop_f = None
+        crop_c = crop_c_f = None
+
+        for size, names, units, coarse, coarse_means, gpu_coarse in bank:
+            tw, th = size
             if th >= crop_h or tw >= crop_w:
                 continue
 
-            for api_name, tmpl in self._templates.items():
-                try:
-                    result = cv2.matchTemplate(crop, tmpl, cv2.TM_CCOEFF_NORMED)
-                except cv2.error:
-                    continue
-
-                locations = np.where(result >= self.threshold)
-                for pt_y, pt_x in zip(*locations):
-                    conf = float(result[pt_y, pt_x])
-                    info = self._champion_map.get(api_name, {})
-                    all_detections.append({
-                        "name": info.get("name", api_name),
-                        "name_kr": info.get("name_kr", api_name),
-                        "apiName": api_name,
-                        "position": (x1 + int(pt_x), y1 + int(pt_y)),
-                        "size": TEMPLATE_SIZE,
-                        "confidence": round(conf, 4),
-                        "area": region_name,
-                        "cost": info.get("cost", 1),
-                    })
-
-        return _nms_boxes(all_detections)
+            # TM_CCOEFF_NORMED를 템플릿마다 호출하면 crop 통계를 매번 다시 계산함.
+            # crop 쪽 준비(float 변환, 창 노름)는 한 번만 하고 템플릿별로는 상관값만 계산
+            if crop_f is None:
+                crop_f = crop.astype(np.float32)
+            wnd, _ = _window_stats(crop, th, tw)
+            wnd_thr = wnd * np.float32(threshold)
+            # OpenCV와 동일하게 분자가 창 노름의 1.125배 이상이면 수치 오차로 보고 0 처리
+            wnd_max = wnd * np.float32(1.125)
+
+            if coarse is not None:
+                if crop_c is None:
+                    crop_c = cv2.pyrDown(crop)
+                    crop_c_f = crop_c.astype(np.float32)
+                cth, ctw = coarse.shape[1:]
+                if cth >= crop_c.shape[0] or ctw >= crop_c.shape[1]:
+                    coarse = None
+            if coarse is not None:
+                wnd_c, mean_c = _window_stats(crop_c, cth, ctw)
+                if gpu_coarse is not None:
+                    # crop은 영역/배율당 한 번만 업로드, 템플릿은 로드 시 업로드해 둠
+                    gpu_crop_c = cv2.cuda_GpuMat()
+                    gpu_crop_c.upload(crop_c_f)
+                # 단색 창은 후보에서 제외 (상관값 0 근처라 임계값 0이면 잡음으로 통과)
+                wnd_c_thr = np.where(wnd_c > 0,
+                                     wnd_c * np.float32(threshold * COARSE_THRESHOLD_RATIO),
+                                     np.float32(np.inf))
+
+            def match(i):
+                """템플릿 i 하나의 (ys, xs, 상관값) — 템플릿끼리 독립이라 병렬 실행 가능"""
+                tmpl = units[i]
+                if coarse is None:
+                    result = cv2.matchTemplate(crop_f, tmpl, cv2.TM_CCORR)
+                    ys, xs = np.nonzero((result >= wnd_thr) & (result < wnd_max))
+                    return ys, xs, result[ys, xs]
+                # 평균 밝기가 비슷한 창만 후보 (한 곳도 없으면 매칭 자체 생략)
+                near = None
+                if MEAN_TOLERANCE is not None:
+                    m = float(coarse_means[i])
+                    near = cv2.inRange(mean_c, m - MEAN_TOLERANCE, m + MEAN_TOLERANCE)
+                    if not cv2.countNonZero(near):
+                        return _NO_HITS
+                if gpu_coarse is not None:
+                    result = self._gpu_matcher.match(gpu_crop_c, gpu_coarse[i]).download()
+                else:
+                    result = cv2.matchTemplate(crop_c_f, coarse[i], cv2.TM_CCORR)
+                cand = cv2.compare(result, wnd_c_thr, cv2.CMP_GE)
+                if near is not None:
+                    cand = cv2.bitwise_and(cand, near)
+                return _refine_candidates(crop_f, tmpl, cand, wnd_thr, wnd_max)
+
+            # matchTemplate는 GIL을 놓으므로 템플릿 단위로 쓰레드 분배 (결과 순서 유지).
+            # GPU 매처는 쓰레드 공유 불가라 GPU 사용 시 순차 실행
+            pool = self._pool if gpu_coarse is None else None
+            matches = pool.map(match, range(len(names))) if pool else map(match, range(len(names)))
+            for api_name, (ys, xs, scores) in zip(names, matches):
+                if len(ys):
+                    hits.append((api_name, size, xs + x1, ys + y1,
+                                 np.minimum(scores / wnd[ys, xs], 1.0)))
+        return hits
 
     def detect_from_region(self, image: np.ndarray, region: str) -> list:
         if region not in REGIONS:
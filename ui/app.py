@@ -1,5 +1,5 @@
 """Flask 웹 UI 서버 - 실시간 대시보드"""
-import json
+import functools
 import os
 import sys
 import time
@@ -9,12 +9,18 @@ import numpy as np
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Blueprint, Flask, Response, render_template, jsonify, request
 from flask.json.provider import DefaultJSONProvider
 
+try:
+    import orjson
+    _ORJSON_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+except ImportError:
+    orjson = None
+
 
 class NumpyJSONProvider(DefaultJSONProvider):
-    """numpy 타입 JSON 직렬화 지원"""
+    """numpy 타입 JSON 직렬화 지원 (orjson 있으면 orjson으로 직렬화)"""
     def default(self, o):
         if isinstance(o, (np.integer,)):
             return int(o)
@@ -24,36 +30,85 @@ class NumpyJSONProvider(DefaultJSONProvider):
             return o.tolist()
         return super().default(o)
 
-from config import COST_COLORS, ICONS_DIR
+    # orjson은 ASCII 이스케이프를 못 하므로 기본 구현도 UTF-8 그대로 출력 (두 경로 결과 일치)
+    ensure_ascii = False
+
+    def _orjson_option(self) -> int:
+        return _ORJSON_OPTS | orjson.OPT_SORT_KEYS if self.sort_keys else _ORJSON_OPTS
+
+    def dumps(self, obj, **kwargs):
+        # 추가 인자(indent 등)는 orjson으로 표현할 수 없으므로 기본 구현
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_option()).decode()
+
+    def response(self, *args, **kwargs):
+        # 디버그(들여쓰기) 출력은 기본 구현 사용
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default,
+                            option=self._orjson_option() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+from config import COST_COLORS, ICONS_DIR, USE_X_SENDFILE
 from engine.recommender import DeckRecommender
 from llm.client import LLMClient
 from data.updater import update_meta, get_last_updated
 
+# SSE 스트림: 변화 없을 때 캡처 상태 확인 주기 / 연결 유지 주석 간격 (초)
+STATUS_PUSH_INTERVAL = 2.0
+SSE_KEEPALIVE = 15.0
+# 추천 결과 캐시 크기 (입력 조합 수)
+RECOMMEND_CACHE_SIZE = 128
+# SSE 변화 판정에 쓰는 캡처 상태 필드 (UI에 표시되는 것만. frame_count 등은 매 틱 바뀜)
+_CAPTURE_DISPLAY_KEYS = ("active", "fps", "detected_count", "has_frame")
+# 인식 결과 대기 최대 시간 (초, 캡처 중지 중에도 주기적으로 깨어남)
+DETECTION_WAIT_TIMEOUT = 5.0
+
 
 def create_app(capture=None, detector=None, llm_url=None):
     app = Flask(__name__)
     app.json_provider_class = NumpyJSONProvider
     app.json = NumpyJSONProvider(app)
-    recommender = DeckRecommender()
+    app.use_x_sendfile = USE_X_SENDFILE
+    # 데이터 로드는 백그라운드 (로드 전 요청은 완료까지 대기)
+    recommender = DeckRecommender(background=True)
     llm = LLMClient(api_url=llm_url) if llm_url else LLMClient()
 
-    # 공유 상태 (thread-safe)
+    @functools.lru_cache(maxsize=RECOMMEND_CACHE_SIZE)
+    def _cached_recommend(champs_t, opps_t, level, limit, generation):
+        return recommender.recommend(champs_t, opps_t, level, limit=limit)
+
+    def _recommend(my_champs, opponents, level, limit=None) -> list[dict]:
+        """추천 (입력과 데이터 세대가 같으면 캐시 재사용).
+        결과 dict는 요청 간 공유되므로 수정 금지"""
+        # 보유 챔피언은 집합, 상대 목록은 순서 무관 → 정렬해서 키 통일
+        # 세대는 계산 전에 읽음 → 재로드와 겹쳐 끝난 이전 데이터 결과는 이전 세대 키로만 저장
+        key = (tuple(sorted(set(my_champs))),
+               tuple(sorted(tuple(o) for o in opponents or ())),
+               level, limit, recommender.generation)
+        return list(_cached_recommend(*key))
+
+    # 공유 상태 (thread-safe) — 목록은 tuple로 통째 교체, 읽기는 참조만 가져감
     _state_lock = threading.Lock()
+    # 인식 결과 갱신 알림 (SSE 스트림 대기용, _state_lock 공유)
+    _state_changed = threading.Condition(_state_lock)
     state = {
-        "my_champions": [],      # 수동 선택 챔피언 (name 기준)
-        "opponents": [],
+        "my_champions": (),      # 수동 선택 챔피언 (name 기준)
+        "opponents": (),
         "level": 7,
         "gold": 0,
         "capturing": False,
-        "detected_champions": [],  # 자동 인식된 챔피언
-        "shop_champions": [],      # 상점 챔피언
+        "detected_champions": (),  # 자동 인식된 챔피언
+        "shop_champions": (),      # 상점 챔피언
         "last_update": 0,
     }
 
-    # 아이콘 서빙: /static/icons/ → data/icons/
-    @app.route("/static/icons/<path:filename>")
-    def serve_icon(filename):
-        return send_from_directory(str(ICONS_DIR), filename)
+    # 아이콘 서빙: /static/icons/ → data/icons/ (정적 파일 핸들러, ETag/조건부 요청 지원)
+    icons = Blueprint("icons", __name__, static_folder=str(ICONS_DIR),
+                      static_url_path="/static/icons")
+    app.register_blueprint(icons)
 
     @app.route("/")
     def index():
@@ -61,38 +116,80 @@ def create_app(capture=None, detector=None, llm_url=None):
                                cost_colors=COST_COLORS,
                                champions=recommender.champions)
 
-    @app.route("/api/status")
-    def api_status():
-        """실시간 상태 폴링 엔드포인트 (2초 간격)"""
+    def _capture_status() -> dict:
+        return capture.get_status() if capture else {
+            "active": False, "fps": 0, "detected_count": 0,
+            "has_frame": False, "interval": 2.0
+        }
+
+    def _capture_display(cap_status: dict) -> tuple:
+        return tuple(cap_status.get(k) for k in _CAPTURE_DISPLAY_KEYS)
+
+    def _status_payload() -> dict:
         with _state_lock:
-            my_champs = list(state["my_champions"])
-            detected = list(state["detected_champions"])
+            my_champs = state["my_champions"]
+            detected = state["detected_champions"]
             level = state["level"]
             gold = state["gold"]
-            opponents = list(state["opponents"])
+            opponents = state["opponents"]
 
         # 캡처에서 인식된 챔피언과 수동 선택 병합
-        all_champs = list(set(my_champs + [d.get("name", "") for d in detected]))
+        all_champs = list(set(my_champs).union(d.get("name", "") for d in detected))
 
-        # 추천 계산
-        recs = recommender.recommend(all_champs, opponents, level) if all_champs else []
-
-        # 캡처 상태
-        cap_status = capture.get_status() if capture else {
-            "active": False, "fps": 0, "detected_count": 0,
-            "has_frame": False, "interval": 2.0
-        }
+        # 추천 계산 (상위 5개만 응답)
+        recs = _recommend(all_champs, opponents, level, limit=5) if all_champs else []
 
-        return jsonify({
+        return {
             "my_champions": my_champs,
             "detected_champions": detected,
             "all_champions": all_champs,
             "level": level,
             "gold": gold,
             "recommendations": recs[:5],
-            "capture": cap_status,
+            "capture": _capture_status(),
             "timestamp": time.time(),
-        })
+        }
+
+    @app.route("/api/status")
+    def api_status():
+        """실시간 상태 폴링 엔드포인트 (SSE 미지원 클라이언트용)"""
+        return jsonify(_status_payload())
+
+    @app.route("/api/stream")
+    def api_stream():
+        """실시간 상태 푸시 (SSE).
+        인식 결과가 갱신됐을 때만 전체 상태를, 그 외엔 캡처 상태가 바뀌었을 때만 보냄"""
+        def generate():
+            with _state_lock:
+                seen = state["last_update"]
+            payload = _status_payload()
+            last_capture = _capture_display(payload["capture"])
+            yield f"data: {app.json.dumps(payload)}\n\n"
+            idle = 0.0
+            while True:
+                with _state_changed:
+                    changed = _state_changed.wait_for(
+                        lambda: state["last_update"] != seen, timeout=STATUS_PUSH_INTERVAL)
+                    seen = state["last_update"]
+                if changed:
+                    payload = _status_payload()
+                    last_capture = _capture_display(payload["capture"])
+                else:
+                    cap_status = _capture_status()
+                    if _capture_display(cap_status) == last_capture:
+                        # 연결 끊긴 클라이언트 정리용 주석 (쓰기 실패 시 generator 종료)
+                        idle += STATUS_PUSH_INTERVAL
+                        if idle >= SSE_KEEPALIVE:
+                            idle = 0.0
+                            yield ": keepalive\n\n"
+                        continue
+                    last_capture = _capture_display(cap_status)
+                    payload = {"capture": cap_status, "timestamp": time.time()}
+                idle = 0.0
+                yield f"data: {app.json.dumps(payload)}\n\n"
+
+        return Response(generate(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
     @app.route("/api/recommend", methods=["POST"])
     def api_recommend():
@@ -102,11 +199,11 @@ def create_app(capture=None, detector=None, llm_url=None):
         level = data.get("level", 7)
 
         with _state_lock:
-            state["my_champions"] = my_champs
-            state["opponents"] = opponents
+            state["my_champions"] = tuple(my_champs)
+            state["opponents"] = tuple(map(tuple, opponents))
             state["level"] = level
 
-        results = recommender.recommend(my_champs, opponents, level)
+        results = _recommend(my_champs, opponents, level)
         return jsonify({"recommendations": results})
 
     @app.route("/api/select_champion", methods=["POST"])
@@ -120,17 +217,16 @@ def create_app(capture=None, detector=None, llm_url=None):
             champs = state["my_champions"]
             if action == "toggle":
                 if name in champs:
-                    champs.remove(name)
+                    champs = tuple(c for c in champs if c != name)
                 else:
-                    champs.append(name)
+                    champs += (name,)
             elif action == "add" and name not in champs:
-                champs.append(name)
+                champs += (name,)
             elif action == "remove" and name in champs:
-                champs.remove(name)
+                champs = tuple(c for c in champs if c != name)
             state["my_champions"] = champs
-            result = list(champs)
 
-        return jsonify({"my_champions": result})
+        return jsonify({"my_champions": champs})
 
     @app.route("/api/set_level", methods=["POST"])
     def api_set_level():
@@ -145,13 +241,13 @@ def create_app(capture=None, detector=None, llm_url=None):
         """상대 챔피언 업데이트"""
         data = request.json or {}
         with _state_lock:
-            state["opponents"] = data.get("opponents", [])
+            state["opponents"] = tuple(map(tuple, data.get("opponents", [])))
         return jsonify({"ok": True})
 
     @app.route("/api/pool", methods=["POST"])
     def api_pool():
         data = request.json or {}
-        opponents = data.get("opponents", [])
+        opponents = tuple(map(tuple, data.get("opponents", [])))
         with _state_lock:
             state["opponents"] = opponents
         pool = recommender.get_pool_status(opponents)
@@ -161,15 +257,34 @@ def create_app(capture=None, detector=None, llm_url=None):
     def api_llm_analyze():
         data = request.json or {}
         with _state_lock:
-            my_champs = data.get("my_champions", list(state["my_champions"]))
+            my_champs = data.get("my_champions", state["my_champions"])
             level = data.get("level", state["level"])
             gold = data.get("gold", state["gold"])
             opponents = state["opponents"]
 
-        recs = recommender.recommend(my_champs, opponents, level)
+        recs = _recommend(my_champs, opponents, level)
         result = llm.analyze_game(my_champs, recs, level=level, gold=gold)
         return jsonify(result)
 
+    @app.route("/api/llm/analyze_stream", methods=["POST"])
+    def api_llm_analyze_stream():
+        """LLM 분석 스트리밍 (SSE) — 토큰 도착 즉시 전달"""
+        data = request.json or {}
+        with _state_lock:
+            my_champs = data.get("my_champions", state["my_champions"])
+            level = data.get("level", state["level"])
+            gold = data.get("gold", state["gold"])
+            opponents = state["opponents"]
+
+        recs = _recommend(my_champs, opponents, level)
+
+        def generate():
+            for event in llm.analyze_game_stream(my_champs, recs, level=level, gold=gold):
+                yield f"data: {app.json.dumps(event)}\n\n"
+
+        return Response(generate(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
     @app.route("/api/llm/status")
     def api_llm_status():
         return jsonify({"available": llm.is_available(), "url": llm.api_url})
@@ -179,6 +294,8 @@ def create_app(capture=None, detector=None, llm_url=None):
         result = update_meta()
         if result["success"]:
             recommender.reload_data()
+            # 정합성은 세대 키로 보장, 비우는 건 이전 세대 메모리 해제용
+            _cached_recommend.cache_clear()
         return jsonify(result)
 
     @app.route("/api/last_updated")
@@ -219,15 +336,15 @@ def create_app(capture=None, detector=None, llm_url=None):
         shop_champs = data.get("shop_champions", [])
 
         with _state_lock:
-            my_champs = data.get("my_champions", list(state["my_champions"]))
+            my_champs = data.get("my_champions", state["my_champions"])
             level = data.get("level", state["level"])
             gold = data.get("gold", state["gold"])
-            opponents = list(state["opponents"])
-            state["shop_champions"] = shop_champs
+            opponents = state["opponents"]
+            state["shop_champions"] = tuple(shop_champs)
 
         # Get recommendations first
         all_champs = list(set(my_champs))
-        recs = recommender.recommend(all_champs, opponents, level) if all_champs else []
+        recs = _recommend(all_champs, opponents, level) if all_champs else []
 
         # Get shop advice
         advice = recommender.get_shop_advice(
@@ -243,14 +360,21 @@ def create_app(capture=None, detector=None, llm_url=None):
     # 캡처 인식 결과를 state에 반영
     if capture:
         def _on_detection_update():
-            """캡처 결과를 주기적으로 state에 반영"""
+            """새 인식 결과가 나올 때마다 state에 반영 (폴링 없이 이벤트 대기)"""
+            event = capture.new_detection_event
             while True:
-                if capture.is_running:
-                    detections = capture.latest_detections
-                    with _state_lock:
+                event.wait(timeout=DETECTION_WAIT_TIMEOUT)
+                # 읽기 전에 clear → 그 사이 들어온 결과는 다음 wait에서 바로 깨어남
+                event.clear()
+                if not capture.is_running:
+                    continue
+                detections = capture.latest_detections
+                with _state_changed:
+                    # 새 인식 결과(새 tuple)일 때만 갱신 → SSE 스트림이 변화분만 전송
+                    if detections is not state["detected_champions"]:
                         state["detected_champions"] = detections
                         state["last_update"] = time.time()
-                time.sleep(1)
+                        _state_changed.notify_all()
 
         t = threading.Thread(target=_on_detection_update, daemon=True)
         t.start()